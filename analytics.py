@@ -0,0 +1,168 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from collections import Counter, deque
+
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "analytics")
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", "5"))
+ANALYTICS_MAX_FILE_BYTES = int(os.getenv("ANALYTICS_MAX_FILE_BYTES", str(10 * 1024 * 1024)))
+ANALYTICS_RETENTION_DAYS = int(os.getenv("ANALYTICS_RETENTION_DAYS", "30"))
+ANALYTICS_MAX_KEYS = int(os.getenv("ANALYTICS_MAX_KEYS", "10000"))
+ANALYTICS_BUFFER_SIZE = 100000
+MAX_QUERY_LENGTH = 100
+
+event_buffer = deque(maxlen=ANALYTICS_BUFFER_SIZE)
+dropped_events = 0
+
+query_counts = Counter()
+zero_result_queries = Counter()
+category_views = Counter()
+course_views = Counter()
+favorite_actions = Counter()
+COUNTERS = (query_counts, zero_result_queries, category_views, course_views, favorite_actions)
+
+flush_task = None
+load_task = None
+loaded = asyncio.Event()
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())[:MAX_QUERY_LENGTH]
+
+def trim(counter):
+    if len(counter) > ANALYTICS_MAX_KEYS:
+        kept = counter.most_common(ANALYTICS_MAX_KEYS // 2)
+        counter.clear()
+        counter.update(dict(kept))
+
+def bump(counter, key):
+    counter[key] += 1
+    trim(counter)
+
+def update_aggregates(event, counters=COUNTERS):
+    queries, zero_results, categories, courses, favorites = counters
+    kind = event.get("event")
+    if kind == "search":
+        query = normalize_query(event.get("query", ""))
+        bump(queries, query)
+        if not event.get("results"):
+            bump(zero_results, query)
+    elif kind == "category_view":
+        bump(categories, event.get("category"))
+    elif kind == "course_view":
+        bump(courses, event.get("course_id"))
+    elif kind in ("fav_add", "fav_remove", "fav_clear"):
+        favorites[kind] += 1
+
+def track(event, user_id, **fields):
+    global dropped_events
+    record = {"ts": round(time.time(), 3), "event": event, "user_id": user_id, **fields}
+    if len(event_buffer) == event_buffer.maxlen:
+        dropped_events += 1
+    event_buffer.append(record)
+    update_aggregates(record)
+
+def log_files():
+    return sorted(glob.glob(os.path.join(ANALYTICS_DIR, "events-*.jsonl")))
+
+def current_log_path():
+    day = time.strftime("%Y%m%d")
+    part = 0
+    while True:
+        path = os.path.join(ANALYTICS_DIR, f"events-{day}-{part:03d}.jsonl")
+        if not os.path.exists(path) or os.path.getsize(path) < ANALYTICS_MAX_FILE_BYTES:
+            return path
+        part += 1
+
+def write_batch(batch):
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+    with open(current_log_path(), 'a', encoding='utf-8') as f:
+        f.write(lines)
+
+def read_events(paths):
+    for path, size in paths:
+        try:
+            with open(path, 'rb') as f:
+                lines = f.read(size).decode('utf-8', errors='replace').splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def log_day(path):
+    return os.path.basename(path)[len("events-"):len("events-YYYYMMDD")]
+
+def retained_log_files():
+    cutoff = time.strftime("%Y%m%d", time.localtime(time.time() - ANALYTICS_RETENTION_DAYS * 86400))
+    retained = []
+    for path in log_files():
+        try:
+            if log_day(path) >= cutoff:
+                retained.append((path, os.path.getsize(path)))
+            else:
+                os.remove(path)
+        except OSError as e:
+            print(f"Ошибка обработки старого лога аналитики: {e}")
+    return retained
+
+def replay_aggregates(paths):
+    counters = tuple(Counter() for _ in COUNTERS)
+    for event in read_events(paths):
+        update_aggregates(event, counters)
+    return counters
+
+async def load_aggregates(paths):
+    try:
+        replayed = await asyncio.to_thread(replay_aggregates, paths)
+        for counter, loaded_counter in zip(COUNTERS, replayed):
+            counter.update(loaded_counter)
+            trim(counter)
+    except Exception as e:
+        print(f"Ошибка загрузки аналитики: {e}")
+    finally:
+        loaded.set()
+
+async def flush():
+    batch = []
+    while event_buffer:
+        batch.append(event_buffer.popleft())
+    if not batch:
+        return
+    try:
+        await asyncio.to_thread(write_batch, batch)
+    except Exception as e:
+        print(f"Ошибка записи аналитики: {e}")
+
+async def flush_loop():
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+        await flush()
+
+def start():
+    global flush_task, load_task
+    load_task = asyncio.create_task(load_aggregates(retained_log_files()))
+    flush_task = asyncio.create_task(flush_loop())
+
+async def stop():
+    global flush_task, load_task
+    if load_task is not None:
+        load_task.cancel()
+        load_task = None
+    if flush_task is not None:
+        flush_task.cancel()
+        flush_task = None
+    await flush()
+
+def top_queries(n=10):
+    return query_counts.most_common(n)
+
+def top_zero_result_queries(n=10):
+    return zero_result_queries.most_common(n)
+
+def top_viewed_courses(n=10):
+    return course_views.most_common(n)
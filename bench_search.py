@@ -0,0 +1,68 @@
+import argparse
+import statistics
+import sys
+import time
+from rapidfuzz import fuzz
+import search_engine
+
+SAMPLE_QUERIES = [
+    "python", "питон для начинающих", "javascript", "react", "kotlin android", "docker",
+    "kubernetes", "машинное обучение", "sql", "взлом", "unity", "linux", "django", "go",
+    "тестирование на проникновение", "data science", "веб-разработка", "c++", "swift ios",
+    "знерщт", "ljrth", "vzlom", "vfibyyjt j,extybt",
+]
+BASELINE_QUERIES = ["go", "react", "unity", "python", "a", "курс", "взлом", "sql", "2023"]
+
+def baseline_search(query):
+    query = query.lower()
+    return [
+        (category, course) for (category, course), text in zip(search_engine.CATALOG, search_engine.SEARCH_TEXTS)
+        if fuzz.partial_ratio(query, text) > search_engine.FUZZY_THRESHOLD
+    ]
+
+def check_baseline(queries):
+    mismatches = 0
+    for query in queries:
+        expected = [course['id'] for _, course in baseline_search(query)]
+        actual = [course['id'] for _, course in search_engine.search_fuzzy(query)]
+        if actual != expected:
+            mismatches += 1
+            print(f"Расхождение с исходным поиском для {query!r}: было {len(expected)}, стало {len(actual)}")
+    return mismatches
+
+def bench(func, queries, repeat):
+    timings = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.95) - 1], timings[-1]
+
+def report(name, func, queries, repeat):
+    mean, p95, worst = bench(func, queries, repeat)
+    print(f"{name:<24} mean {mean:8.3f} ms   p95 {p95:8.3f} ms   max {worst:8.3f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер скорости поиска по каталогу")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--check", action="store_true", help="сверить fuzzy с исходным поиском")
+    args = parser.parse_args()
+
+    if args.check:
+        return 1 if check_baseline(BASELINE_QUERIES) else 0
+
+    print(f"Курсов: {len(search_engine.CATALOG)}, запросов: {len(SAMPLE_QUERIES)} x {args.repeat}")
+    for name, func in search_engine.ENGINES.items():
+        report(name, func, SAMPLE_QUERIES, args.repeat)
+
+    print(f"Словарь подсказок: {len(search_engine.VOCABULARY)} слов")
+    prefixes = [query[:3] for query in SAMPLE_QUERIES]
+    report("complete", search_engine.complete, prefixes, args.repeat)
+    typos = ["pythn", "машиное обучени", "kuber", "докер", "jav", "zzzzqq", "реакт натив"]
+    report("suggest", search_engine.suggest, typos, args.repeat)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from collections import defaultdict
+import aiohttp
+import numpy as np
+from rapidfuzz import fuzz, process
+from courses_data import COURSES
+
+LINK_CACHE_FILE = "link_cache.json"
+
+def iter_courses():
+    for category, courses in COURSES.items():
+        for course in courses:
+            yield category, course
+
+def normalize_title(title: str) -> str:
+    return " ".join(re.findall(r"\w+", title.lower()))
+
+def find_duplicate_ids():
+    index = defaultdict(list)
+    for category, course in iter_courses():
+        index[course['id']].append((category, course['title']))
+    return {course_id: places for course_id, places in index.items() if len(places) > 1}
+
+def find_duplicate_urls():
+    index = defaultdict(list)
+    for _, course in iter_courses():
+        for link in course.get('links', []):
+            index[link['url'].strip().rstrip('/')].append(course['id'])
+    return {url: ids for url, ids in index.items() if len(ids) > 1}
+
+def find_similar_titles(threshold=90):
+    courses = [course for _, course in iter_courses()]
+    titles = [normalize_title(course['title']) for course in courses]
+    matrix = process.cdist(titles, titles, scorer=fuzz.token_sort_ratio, score_cutoff=threshold, workers=-1)
+    rows, cols = np.nonzero(np.triu(matrix, k=1))
+    return [
+        (courses[i]['id'], courses[j]['id'], round(float(matrix[i, j]), 1))
+        for i, j in zip(rows.tolist(), cols.tolist())
+    ]
+
+def load_link_cache(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_link_cache(path, cache):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"Ошибка сохранения кэша ссылок: {e}")
+
+async def check_url(session, semaphore, url, timeout):
+    async with semaphore:
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=True) as resp:
+                return {"ok": resp.status < 400, "status": resp.status, "checked_at": time.time()}
+        except Exception as e:
+            return {"ok": False, "status": None, "error": type(e).__name__, "checked_at": time.time()}
+
+async def check_links(urls, cache, concurrency=20, timeout=15, ttl=86400):
+    now = time.time()
+    pending = [url for url in urls if url not in cache or now - cache[url].get("checked_at", 0) > ttl]
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=max(1, concurrency // 4))
+    async with aiohttp.ClientSession(connector=connector) as session:
+        results = await asyncio.gather(*(check_url(session, semaphore, url, timeout) for url in pending))
+    for url, result in zip(pending, results):
+        cache[url] = result
+    return {url: cache[url] for url in urls}
+
+def catalog_urls():
+    urls = []
+    seen = set()
+    for _, course in iter_courses():
+        for link in course.get('links', []):
+            url = link['url'].strip()
+            if url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка каталога курсов на дубликаты и битые ссылки")
+    parser.add_argument("--links", action="store_true", help="проверить доступность ссылок")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=15)
+    parser.add_argument("--ttl", type=float, default=86400, help="срок жизни результата в кэше, сек")
+    parser.add_argument("--cache", default=LINK_CACHE_FILE)
+    parser.add_argument("--threshold", type=float, default=90, help="порог похожести названий")
+    args = parser.parse_args()
+
+    problems = 0
+
+    duplicate_ids = find_duplicate_ids()
+    for course_id, places in duplicate_ids.items():
+        problems += 1
+        print(f"Дубликат id {course_id}: " + "; ".join(f"{cat}: {title}" for cat, title in places))
+
+    for url, ids in find_duplicate_urls().items():
+        print(f"Одна ссылка у курсов {ids}: {url}")
+
+    for first_id, second_id, score in find_similar_titles(args.threshold):
+        print(f"Похожие названия ({score}): {first_id} и {second_id}")
+
+    if args.links:
+        cache = load_link_cache(args.cache)
+        results = asyncio.run(check_links(catalog_urls(), cache, args.concurrency, args.timeout, args.ttl))
+        save_link_cache(args.cache, cache)
+        for url, result in results.items():
+            if not result["ok"]:
+                problems += 1
+                print(f"Недоступна ссылка ({result.get('status') or result.get('error')}): {url}")
+
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
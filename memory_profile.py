@@ -0,0 +1,171 @@
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from types import FunctionType, ModuleType
+
+MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "0") == "1"
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "5"))
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "300"))
+MEMORY_HISTORY_SIZE = 288
+MEMORY_WALK_CHUNK = 50
+MEMORY_WALK_SLICE = 0.005
+MEMORY_DUMP_DIR = os.getenv("MEMORY_DUMP_DIR", "memory_dumps")
+
+structures = {}
+history = deque(maxlen=MEMORY_HISTORY_SIZE)
+baseline = None
+sample_task = None
+
+SKIP_TYPES = (type, ModuleType, FunctionType)
+
+def register(name, obj):
+    structures[name] = obj
+
+async def pause(deadline):
+    if time.perf_counter() < deadline:
+        return deadline
+    await asyncio.sleep(0)
+    return time.perf_counter() + MEMORY_WALK_SLICE
+
+async def deep_size(obj, seen):
+    size = 0
+    stack = [obj]
+    deadline = time.perf_counter() + MEMORY_WALK_SLICE
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        if len(seen) % MEMORY_WALK_CHUNK == 0:
+            deadline = await pause(deadline)
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(current)
+        elif hasattr(current, '__dict__'):
+            stack.append(current.__dict__)
+    return size
+
+async def release(seen):
+    deadline = time.perf_counter() + MEMORY_WALK_SLICE
+    while seen:
+        seen.pop()
+        if len(seen) % MEMORY_WALK_CHUNK == 0:
+            deadline = await pause(deadline)
+
+async def structure_sizes():
+    seen = set()
+    sizes = {name: await deep_size(obj, seen) for name, obj in structures.items()}
+    await release(seen)
+    return sizes
+
+def structure_lengths():
+    return {name: len(obj) for name, obj in structures.items() if hasattr(obj, '__len__')}
+
+def object_counts(limit=15):
+    return Counter(type(obj).__name__ for obj in gc.get_objects()).most_common(limit)
+
+def traced_memory():
+    if not tracemalloc.is_tracing():
+        return None
+    return tracemalloc.get_traced_memory()
+
+async def sample():
+    entry = {"ts": time.time(), "sizes": await structure_sizes()}
+    traced = traced_memory()
+    if traced is not None:
+        entry["traced_current"], entry["traced_peak"] = traced
+    history.append(entry)
+    return entry
+
+def take_baseline():
+    global baseline
+    if not tracemalloc.is_tracing():
+        return False
+    baseline = tracemalloc.take_snapshot()
+    return True
+
+def snapshot_diff(limit=10, dump=False):
+    if baseline is None or not tracemalloc.is_tracing():
+        return None, None
+    stats = tracemalloc.take_snapshot().compare_to(baseline, 'lineno')
+    path = None
+    if dump:
+        os.makedirs(MEMORY_DUMP_DIR, exist_ok=True)
+        path = os.path.join(MEMORY_DUMP_DIR, f"diff-{time.strftime('%Y%m%d-%H%M%S')}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(str(stat) for stat in stats))
+    return stats[:limit], path
+
+async def sample_loop():
+    while True:
+        await sample()
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+def start():
+    global sample_task
+    if not MEMORY_PROFILING:
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+    take_baseline()
+    sample_task = asyncio.create_task(sample_loop())
+
+def stop():
+    global sample_task
+    if sample_task is not None:
+        sample_task.cancel()
+        sample_task = None
+
+def last_sample_metrics():
+    if not history:
+        return {}
+    entry = history[-1]
+    values = {f"size_bytes_{name}": size for name, size in entry["sizes"].items()}
+    if "traced_current" in entry:
+        values["traced_current_bytes"] = entry["traced_current"]
+        values["traced_peak_bytes"] = entry["traced_peak"]
+    return values
+
+def format_bytes(size):
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+def light_report():
+    lines = ["🧠 Размеры структур (элементов):"]
+    lines += [f"{name}: {length}" for name, length in structure_lengths().items()]
+    lines.append("\nПодробный отчёт по памяти выключен (MEMORY_PROFILING=1)")
+    return "\n".join(lines)
+
+async def report():
+    if not MEMORY_PROFILING:
+        return light_report()
+    entry = await sample()
+    lines = ["🧠 Память по структурам:"]
+    lines += [f"{name}: {format_bytes(size)}" for name, size in entry["sizes"].items()]
+    if "traced_current" in entry:
+        lines.append(
+            f"tracemalloc: {format_bytes(entry['traced_current'])} (пик {format_bytes(entry['traced_peak'])})"
+        )
+    else:
+        lines.append("tracemalloc выключен")
+    if len(history) > 1:
+        first = history[0]
+        growth = sum(entry["sizes"].values()) - sum(first["sizes"].values())
+        minutes = (entry["ts"] - first["ts"]) / 60
+        lines.append(f"Рост за {minutes:.0f} мин: {format_bytes(growth) if growth >= 0 else '-' + format_bytes(-growth)}")
+    return "\n".join(lines)
+
+def objects_report(limit=10):
+    lines = ["🧠 Объекты в памяти:"]
+    lines += [f"{name}: {count}" for name, count in object_counts(limit)]
+    return "\n".join(lines)
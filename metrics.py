@@ -0,0 +1,38 @@
+import os
+from aiohttp import web
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+collectors = {}
+runner = None
+
+def register(name, collector):
+    collectors[name] = collector
+
+def collect():
+    values = {}
+    for name, collector in collectors.items():
+        for key, value in collector().items():
+            values[f"{name}_{key}"] = value
+    return values
+
+async def metrics_handler(request):
+    lines = [f"coursesbot_{key} {value}" for key, value in sorted(collect().items())]
+    return web.Response(text="\n".join(lines) + "\n")
+
+async def start():
+    global runner
+    if not METRICS_PORT:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+
+async def stop():
+    global runner
+    if runner is not None:
+        await runner.cleanup()
+        runner = None
@@ -0,0 +1,55 @@
+import heapq
+import os
+from collections import Counter, defaultdict
+
+SIMILAR_COURSES_LIMIT = int(os.getenv("SIMILAR_COURSES_LIMIT", "3"))
+
+co_counts = defaultdict(Counter)
+neighbors = {}
+
+def refresh_neighbors(course_id):
+    counts = co_counts.get(course_id)
+    if not counts:
+        co_counts.pop(course_id, None)
+        neighbors.pop(course_id, None)
+        return
+    top = heapq.nlargest(SIMILAR_COURSES_LIMIT, counts.items(), key=lambda item: (item[1], -item[0]))
+    neighbors[course_id] = tuple(other for other, _ in top)
+
+def add_favorite(fav_list, course_id):
+    for other in fav_list:
+        if other == course_id:
+            continue
+        co_counts[course_id][other] += 1
+        co_counts[other][course_id] += 1
+        refresh_neighbors(other)
+    refresh_neighbors(course_id)
+
+def remove_favorite(fav_list, course_id):
+    for other in fav_list:
+        if other == course_id:
+            continue
+        for first, second in ((course_id, other), (other, course_id)):
+            counts = co_counts.get(first)
+            if counts is None:
+                continue
+            counts[second] -= 1
+            if counts[second] <= 0:
+                del counts[second]
+        refresh_neighbors(other)
+    refresh_neighbors(course_id)
+
+def build(favorites):
+    co_counts.clear()
+    neighbors.clear()
+    for fav_list in favorites.values():
+        unique = list(dict.fromkeys(fav_list))
+        for i, course_id in enumerate(unique):
+            for other in unique[i + 1:]:
+                co_counts[course_id][other] += 1
+                co_counts[other][course_id] += 1
+    for course_id in list(co_counts):
+        refresh_neighbors(course_id)
+
+def similar_courses(course_id):
+    return neighbors.get(course_id, ())
@@ -1,13 +1,24 @@
 import asyncio
 import json
 import os
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from rapidfuzz import fuzz
 from courses_data import COURSE_CATEGORIES, COURSES
 from aiogram.types import InlineKeyboardButton
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+import analytics
+import recommendations
+import stats
+import metrics
+import sessions
+import users
+import memory_profile
+from throttling import ThrottlingMiddleware
+import search_engine
 
 load_dotenv()
 
@@ -18,13 +29,34 @@ ADMIN_IDS = set(int(x.strip()) for x in admin_ids_str.split(",") if x.strip())
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
 
+throttling = ThrottlingMiddleware(ADMIN_IDS)
+dp.message.outer_middleware(throttling)
+dp.callback_query.outer_middleware(throttling)
+
 FAVORITES_FILE = "favorites.json"
+CALLBACK_ANSWER_FIRST = os.getenv("CALLBACK_ANSWER_FIRST", "1") == "1"
+COURSES_PAGE_SIZE = int(os.getenv("COURSES_PAGE_SIZE", "10"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+USERS_SAVE_INTERVAL = float(os.getenv("USERS_SAVE_INTERVAL", "60"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1000"))
+WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", "200"))
+POPULAR_COURSES_LIMIT = 10
+POPULAR_REFRESH_INTERVAL = float(os.getenv("POPULAR_REFRESH_INTERVAL", "600"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "3600"))
+SESSION_SWEEP_INTERVAL = 60
+
+SILENT_CALLBACKS = {
+    "menu_courses", "back_main", "course_prev", "course_next",
+    "start_search", "search_prev", "search_next",
+    "view_favorites", "fav_clear", "fav_clear_yes", "noop",
+}
 
 def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS
 
 user_states = {}
 user_positions = {}
+user_last_seen = OrderedDict()
 favorites = {}
 
 def load_favorites():
@@ -43,6 +75,57 @@ def save_favorites(data):
 
 favorites = load_favorites()
 
+if not users.load():
+    users.seed(int(uid) for uid in favorites)
+
+background_tasks = set()
+
+def background_task_done(task):
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Ошибка фоновой задачи: {task.exception()!r}")
+
+def run_in_background(coro):
+    task = asyncio.ensure_future(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_task_done)
+    return task
+
+async def already_answered(*args, **kwargs):
+    return None
+
+def answer_early(call):
+    if not CALLBACK_ANSWER_FIRST:
+        return call.answer
+    run_in_background(call.answer())
+    return already_answered
+
+COURSES_BY_ID = {course['id']: course for courses in COURSES.values() for course in courses}
+COURSE_LOCATIONS = {
+    course['id']: (category, idx) for category, courses in COURSES.items() for idx, course in enumerate(courses)
+}
+
+recommendations.build(favorites)
+stats.build(favorites, {course_id: category for course_id, (category, _) in COURSE_LOCATIONS.items()})
+
+def add_favorite(user_id, course_id):
+    fav_list = favorites.setdefault(str(user_id), [])
+    recommendations.add_favorite(fav_list, course_id)
+    stats.add_favorite(fav_list, course_id)
+    fav_list.append(course_id)
+
+def remove_favorite(user_id, course_id):
+    fav_list = favorites.setdefault(str(user_id), [])
+    fav_list.remove(course_id)
+    recommendations.remove_favorite(fav_list, course_id)
+    stats.remove_favorite(fav_list, course_id)
+
+def clear_favorites(user_id):
+    fav_list = favorites.get(str(user_id), [])
+    while fav_list:
+        remove_favorite(user_id, fav_list[-1])
+    favorites[str(user_id)] = []
+
 def total_courses_count():
     return sum(len(courses) for courses in COURSES.values())
 
@@ -58,7 +141,7 @@ def main_menu_keyboard():
 def categories_keyboard():
     kb = InlineKeyboardBuilder()
     for key, name in COURSE_CATEGORIES.items():
-        kb.button(text=name, callback_data=f"category:{key}")
+        kb.button(text=name, callback_data=f"catpage:{key}:0")
     kb.button(text="⬅️ Назад", callback_data="back_main")
     kb.adjust(1)
     return kb.as_markup()
@@ -73,7 +156,63 @@ def format_course_message(course, current_idx, total):
         f"{links_text}"
     )
 
-def course_navigation_keyboard(course, current_idx, total, prefix, fav_list):
+def build_category_pages(page_size):
+    pages = {}
+    for key, courses in COURSES.items():
+        numbered = list(enumerate(courses))
+        pages[key] = [numbered[i:i + page_size] for i in range(0, len(numbered), page_size)]
+    return pages
+
+def format_category_page(category_key, page, pages_total, page_courses):
+    lines = "\n".join(
+        f"{idx + 1}. {course['title']} ({course.get('year', 'Неизвестно')})" for idx, course in page_courses
+    )
+    return (
+        f"{COURSE_CATEGORIES.get(category_key, category_key)}\n"
+        f"Страница {page + 1} из {pages_total}\n\n"
+        f"{lines}"
+    )
+
+def category_page_keyboard(category_key, page, pages_total, page_courses):
+    kb = InlineKeyboardBuilder()
+    for idx, _ in page_courses:
+        kb.button(text=str(idx + 1), callback_data=f"catcourse:{category_key}:{idx}")
+    kb.adjust(5)
+
+    kb.row(InlineKeyboardButton(text="🔥 Популярное", callback_data=f"catpopular:{category_key}"))
+
+    buttons = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"catpage:{category_key}:{page - 1}"))
+
+    buttons.append(InlineKeyboardButton(text=f"{page + 1}/{pages_total}", callback_data="noop"))
+
+    if page < pages_total - 1:
+        buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"catpage:{category_key}:{page + 1}"))
+
+    kb.row(*buttons)
+    kb.row(
+        InlineKeyboardButton(text="⬅️ Категории", callback_data="menu_courses"),
+        InlineKeyboardButton(text="🏠 Меню", callback_data="back_main")
+    )
+    return kb.as_markup()
+
+def build_category_page_views(pages):
+    views = {}
+    for key, key_pages in pages.items():
+        views[key] = [
+            (
+                format_category_page(key, page, len(key_pages), page_courses),
+                category_page_keyboard(key, page, len(key_pages), page_courses),
+            )
+            for page, page_courses in enumerate(key_pages)
+        ]
+    return views
+
+CATEGORY_PAGES = build_category_pages(COURSES_PAGE_SIZE)
+CATEGORY_PAGE_VIEWS = build_category_page_views(CATEGORY_PAGES)
+
+def course_navigation_keyboard(course, current_idx, total, prefix, fav_list, category=None):
     kb = InlineKeyboardBuilder()
 
     if course['id'] in fav_list:
@@ -85,18 +224,40 @@ def course_navigation_keyboard(course, current_idx, total, prefix, fav_list):
             InlineKeyboardButton(text="⭐ Добавить в избранное", callback_data=f"fav_add:{course['id']}")
         )
 
+    if prefix == "course" and category is not None:
+        carried = f":{category}:{current_idx}"
+    elif prefix == "fav":
+        carried = f":{current_idx}"
+    else:
+        carried = ""
+
     buttons = []
     if current_idx > 0:
-        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}_prev"))
+        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}_prev{carried}"))
 
     buttons.append(InlineKeyboardButton(text=f"{current_idx+1}/{total}", callback_data="choose_course_number"))
 
     if current_idx < total - 1:
-        buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}_next"))
+        buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}_next{carried}"))
 
     if buttons:
         kb.row(*buttons)
 
+    for similar_id in recommendations.similar_courses(course['id']):
+        similar = COURSES_BY_ID.get(similar_id)
+        if similar is None:
+            continue
+        title = similar['title'] if len(similar['title']) <= 40 else similar['title'][:39] + "…"
+        kb.row(InlineKeyboardButton(text=f"Похожий: {title}", callback_data=f"course_open:{similar_id}"))
+
+    if prefix == "course" and category is not None:
+        kb.row(
+            InlineKeyboardButton(
+                text="📋 Список",
+                callback_data=f"catpage:{category}:{current_idx // COURSES_PAGE_SIZE}"
+            )
+        )
+
     kb.row(
         InlineKeyboardButton(text="⬅️ Категории", callback_data="menu_courses"),
         InlineKeyboardButton(text="🏠 Меню", callback_data="back_main")
@@ -104,28 +265,263 @@ def course_navigation_keyboard(course, current_idx, total, prefix, fav_list):
 
     return kb.as_markup()
 
-async def send_course_message(call, course, current_idx, total, prefix):
+async def send_course_message(call, course, current_idx, total, prefix, category=None):
     text = format_course_message(course, current_idx, total)
     user_id = call.from_user.id
+    analytics.track("course_view", user_id, course_id=course['id'], source=prefix)
     fav_list = favorites.setdefault(str(user_id), [])
-    keyboard = course_navigation_keyboard(course, current_idx, total, prefix, fav_list)
+    keyboard = course_navigation_keyboard(course, current_idx, total, prefix, fav_list, category)
     await call.message.edit_text(text, reply_markup=keyboard)
 
+search_cache = OrderedDict()
+
+def cache_search_results(key, results):
+    search_cache[key] = results
+    search_cache.move_to_end(key)
+    while len(search_cache) > SEARCH_CACHE_SIZE:
+        search_cache.popitem(last=False)
+
 def search_courses(query: str):
-    query = query.lower()
-    results = []
-    for category, courses in COURSES.items():
-        for course in courses:
-            searchable_text = f"{course['title']} {course.get('description', '')} {course.get('year', '')} " + \
-                              " ".join(link['title'] + " " + link['url'] for link in course.get('links', []))
-            score = fuzz.partial_ratio(query, searchable_text.lower())
-            if score > 70:
-                results.append((category, course))
+    key = analytics.normalize_query(query)
+    results = search_cache.get(key)
+    if results is not None:
+        search_cache.move_to_end(key)
+        return results
+    results = search_engine.search(key)
+    cache_search_results(key, results)
     return results
 
+async def warm_up_search():
+    await analytics.loaded.wait()
+    for query, _ in analytics.top_queries(WARMUP_QUERIES):
+        if not query or query in search_cache:
+            continue
+        results = await asyncio.to_thread(search_engine.search, query)
+        cache_search_results(query, results)
+
+def compute_popular_courses():
+    by_category = {}
+    for course_id, count in stats.top_courses(len(stats.ranking)):
+        if course_id not in COURSE_LOCATIONS:
+            continue
+        category, idx = COURSE_LOCATIONS[course_id]
+        top = by_category.setdefault(category, [])
+        if len(top) < POPULAR_COURSES_LIMIT:
+            top.append((idx, count))
+    return by_category
+
+def popular_courses_view(category_key, top):
+    courses = courses_in_category(category_key)
+    lines = "\n".join(
+        f"{i}. {courses[idx]['title']} — ⭐ {count}" for i, (idx, count) in enumerate(top, 1)
+    )
+    text = f"🔥 Популярное: {COURSE_CATEGORIES.get(category_key, category_key)}\n\n{lines}"
+    kb = InlineKeyboardBuilder()
+    for i, (idx, _) in enumerate(top, 1):
+        kb.button(text=str(i), callback_data=f"catcourse:{category_key}:{idx}")
+    kb.adjust(5)
+    kb.row(
+        InlineKeyboardButton(text="📋 Список", callback_data=f"catpage:{category_key}:0"),
+        InlineKeyboardButton(text="🏠 Меню", callback_data="back_main")
+    )
+    return text, kb.as_markup()
+
+popular_views = {}
+
+def build_popular_views():
+    global popular_views
+    popular_views = {
+        category: popular_courses_view(category, top) for category, top in compute_popular_courses().items()
+    }
+
+async def popular_refresh_loop():
+    while True:
+        await asyncio.sleep(POPULAR_REFRESH_INTERVAL)
+        build_popular_views()
+
+def suggestions_keyboard(suggestions):
+    kb = InlineKeyboardBuilder()
+    for suggestion in suggestions:
+        callback_data = f"search_q:{suggestion}"
+        if len(callback_data.encode('utf-8')) <= 64:
+            kb.button(text=f"🔍 {suggestion}", callback_data=callback_data)
+    kb.button(text="🔍 Новый поиск", callback_data="start_search")
+    kb.button(text="🏠 Меню", callback_data="back_main")
+    kb.adjust(1)
+    return kb.as_markup()
+
+def run_user_search(user_id, query):
+    results = search_courses(query)
+    analytics.track("search", user_id, query=query, results=len(results))
+    if not results:
+        user_states.pop(user_id, None)
+        suggestions = search_engine.suggest(query)
+        if suggestions:
+            return "Ничего не найдено. Возможно, вы имели в виду:", suggestions_keyboard(suggestions)
+        return "Ничего не найдено. Попробуйте другой запрос.", suggestions_keyboard(suggestions)
+    user_states[user_id] = {"type": "local_search_results", "results": results}
+    user_positions[user_id] = 0
+    category, course = results[0]
+    user_fav_list = favorites.setdefault(str(user_id), [])
+    keyboard = course_navigation_keyboard(course, 0, len(results), "search", user_fav_list)
+    text = f"Результаты поиска:\n\n{format_course_message(course, 0, len(results))}\nКатегория: {COURSE_CATEGORIES.get(category, category)}"
+    analytics.track("course_view", user_id, course_id=course['id'], source="search")
+    return text, keyboard
+
+def format_top_list(title, items):
+    if not items:
+        return ""
+    lines = "\n".join(f"{i}. {name} — {count}" for i, (name, count) in enumerate(items, 1))
+    return f"\n\n{title}\n{lines}"
+
+def course_title(course_id):
+    return COURSES_BY_ID[course_id]['title'] if course_id in COURSES_BY_ID else course_id
+
+def format_favorite_stats():
+    categories = [
+        (COURSE_CATEGORIES.get(category, category or "—"), count)
+        for category, count in stats.category_counts.most_common()
+    ]
+    top = [(course_title(course_id), count) for course_id, count in stats.top_courses(5)]
+    return (
+        format_top_list("⭐ Топ избранного:", top)
+        + format_top_list("📂 Избранное по категориям:", categories)
+    )
+
+def format_throttling_stats():
+    snapshot = throttling.snapshot()
+    return (
+        f"\n\n🚦 Ограничено: {snapshot.get('throttled', 0)}"
+        f", отброшено: {snapshot.get('shed_redundant', 0) + snapshot.get('shed_overload', 0)}"
+        f", в очереди: {snapshot.get('queued', 0)}"
+        f", в обработке: {snapshot['in_flight']}"
+    )
+
+def favorites_metrics():
+    return {
+        "users": len(favorites),
+        "users_with_favorites": stats.users_with_favorites,
+        "total": stats.total_favorites,
+        "active_sessions": len(user_states),
+    }
+
+def users_metrics():
+    return {
+        "total": users.total(),
+        "blocked": users.blocked_count(),
+        "deactivated": users.deactivated_count(),
+    }
+
+def analytics_metrics():
+    return {"buffered_events": len(analytics.event_buffer), "dropped_events": analytics.dropped_events}
+
+def find_course(course_id):
+    location = COURSE_LOCATIONS.get(course_id)
+    if location is None:
+        return None
+    category, idx = location
+    return category, COURSES[category][idx]
+
+def restore_session(user_id):
+    restored = sessions.restore(user_id, find_course)
+    if restored is None or user_id in user_states:
+        return
+    state, position = restored
+    if state is not None:
+        user_states[user_id] = state
+        user_positions[user_id] = position
+
+async def user_context_middleware(handler, event, data):
+    user = data.get("event_from_user")
+    if user is not None:
+        users.register(user.id)
+        user_last_seen[user.id] = time.monotonic()
+        user_last_seen.move_to_end(user.id)
+        if sessions.pending:
+            restore_session(user.id)
+    return await handler(event, data)
+
+dp.message.outer_middleware(user_context_middleware)
+dp.callback_query.outer_middleware(user_context_middleware)
+
+def expire_idle_sessions(now):
+    while user_last_seen:
+        user_id, last_seen = next(iter(user_last_seen.items()))
+        if now - last_seen < SESSION_IDLE_TIMEOUT:
+            break
+        del user_last_seen[user_id]
+        user_states.pop(user_id, None)
+        user_positions.pop(user_id, None)
+
+async def session_expiry_loop():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        expire_idle_sessions(time.monotonic())
+
+async def users_save_loop():
+    while True:
+        await asyncio.sleep(USERS_SAVE_INTERVAL)
+        if users.dirty:
+            users.save()
+
+metrics.register("throttling", throttling.snapshot)
+metrics.register("favorites", favorites_metrics)
+metrics.register("users", users_metrics)
+metrics.register("memory", memory_profile.last_sample_metrics)
+
+memory_profile.register("courses", COURSES)
+memory_profile.register("search_index", (search_engine.TFIDF_COLUMNS, search_engine.TFIDF_DOC_IDS, search_engine.TFIDF_WEIGHTS, search_engine.SEARCH_TEXTS, search_engine.TRANSLIT_FORMS, search_engine.VOCABULARY))
+memory_profile.register("category_pages", CATEGORY_PAGE_VIEWS)
+memory_profile.register("favorites", favorites)
+memory_profile.register("user_states", user_states)
+memory_profile.register("user_positions", user_positions)
+memory_profile.register("user_last_seen", user_last_seen)
+memory_profile.register("search_cache", search_cache)
+memory_profile.register("recommendations", recommendations.co_counts)
+memory_profile.register("favorite_stats", stats.ranking)
+memory_profile.register("analytics_buffer", analytics.event_buffer)
+memory_profile.register("users", (users.user_ids, users.flags))
+memory_profile.register("sessions_pending", sessions.pending)
+memory_profile.register("throttling_buckets", throttling.buckets)
+memory_profile.register("aiogram_storage", dp.storage)
+metrics.register("analytics", analytics_metrics)
+
+def format_analytics_stats():
+    viewed = [(course_title(course_id), count) for course_id, count in analytics.top_viewed_courses(5)]
+    return (
+        format_top_list("🔍 Популярные запросы:", analytics.top_queries(5))
+        + format_top_list("🚫 Запросы без результатов:", analytics.top_zero_result_queries(5))
+        + format_top_list("👀 Самые просматриваемые курсы:", viewed)
+    )
+
 def courses_in_category(category_key):
     return COURSES.get(category_key, [])
 
+async def send_broadcast_message(uid, text):
+    try:
+        await bot.send_message(uid, text)
+    except TelegramRetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        await bot.send_message(uid, text)
+
+async def broadcast(text):
+    count_sent = 0
+    count_failed = 0
+    for uid in users.deliverable():
+        try:
+            await send_broadcast_message(uid, text)
+            count_sent += 1
+        except TelegramForbiddenError as e:
+            if "deactivated" in str(e):
+                users.mark_deactivated(uid)
+            else:
+                users.mark_blocked(uid)
+            count_failed += 1
+        except Exception:
+            count_failed += 1
+    users.save()
+    return count_sent, count_failed
+
 @dp.message(Command("start"))
 async def start_handler(message: types.Message):
     user_states.pop(message.from_user.id, None)
@@ -141,27 +537,59 @@ async def admin_panel_handler(message: types.Message):
     kb = InlineKeyboardBuilder()
     kb.button(text="📊 Статистика", callback_data="admin_stats")
     kb.button(text="📣 Рассылка", callback_data="admin_broadcast")
+    kb.button(text="🧠 Память", callback_data="admin_memory")
     kb.button(text="🏠 Главное меню", callback_data="back_main")
     kb.adjust(1)
     await message.answer("Админ-панель:", reply_markup=kb.as_markup())
 
+def format_memory_diff(dump):
+    diff_stats, path = memory_profile.snapshot_diff(dump=dump)
+    if diff_stats is None:
+        return "Нет базового снимка: включите MEMORY_PROFILING=1 или выполните /memory snapshot."
+    lines = ["🧠 Разница с базовым снимком:"] + [str(stat) for stat in diff_stats]
+    if path:
+        lines.append(f"\nПолный отчёт: {path}")
+    return "\n".join(lines)
+
+@dp.message(Command("memory"))
+async def memory_handler(message: types.Message, command: CommandObject):
+    if not is_admin(message.from_user.id):
+        await message.answer("Доступ запрещён.")
+        return
+    arg = (command.args or "").strip().lower()
+    if arg == "snapshot":
+        if memory_profile.take_baseline():
+            text = "Базовый снимок памяти сохранён."
+        else:
+            text = "tracemalloc выключен (MEMORY_PROFILING=1)."
+    elif arg in ("diff", "dump"):
+        text = format_memory_diff(arg == "dump")
+    elif arg == "objects":
+        text = memory_profile.objects_report()
+    else:
+        text = await memory_profile.report()
+    await message.answer(text[:4000])
+
 @dp.callback_query()
 async def callbacks_handler(call: types.CallbackQuery):
     data = call.data
     user_id = call.from_user.id
 
+    action = data.split(':', 1)[0]
+    answer = answer_early(call) if action in SILENT_CALLBACKS else call.answer
+
     if data == "menu_courses":
         await call.message.edit_text("Выберите категорию курсов:", reply_markup=categories_keyboard())
-        user_states[user_id] = None
-        user_positions[user_id] = None
-        await call.answer()
+        user_states.pop(user_id, None)
+        user_positions.pop(user_id, None)
+        await answer()
         return
 
     if data == "back_main":
-        user_states[user_id] = None
-        user_positions[user_id] = None
+        user_states.pop(user_id, None)
+        user_positions.pop(user_id, None)
         await call.message.edit_text("Выберите действие:", reply_markup=main_menu_keyboard())
-        await call.answer()
+        await answer()
         return
 
     if data.startswith("category:"):
@@ -170,27 +598,100 @@ async def callbacks_handler(call: types.CallbackQuery):
         if not courses:
             await call.answer("В этой категории курсов нет.")
             return
+        answer = answer_early(call)
+        user_states[user_id] = f"category:{category}"
+        user_positions[user_id] = 0
+        analytics.track("category_view", user_id, category=category, page=0)
+        await send_course_message(call, courses[0], 0, len(courses), "course", category)
+        await answer()
+        return
+
+    if data.startswith("catpage:"):
+        _, category, page = data.split(':')
+        views = CATEGORY_PAGE_VIEWS.get(category)
+        if not views:
+            await call.answer("В этой категории курсов нет.")
+            return
+        page = min(max(int(page), 0), len(views) - 1)
+        answer = answer_early(call)
+        user_states[user_id] = f"category:{category}"
+        user_positions[user_id] = page * COURSES_PAGE_SIZE
+        analytics.track("category_view", user_id, category=category, page=page)
+        text, keyboard = views[page]
+        await call.message.edit_text(text, reply_markup=keyboard)
+        await answer()
+        return
+
+    if data.startswith("catcourse:"):
+        _, category, idx = data.split(':')
+        courses = courses_in_category(category)
+        idx = int(idx)
+        if not 0 <= idx < len(courses):
+            await call.answer("Курс не найден.")
+            return
+        answer = answer_early(call)
+        user_states[user_id] = f"category:{category}"
+        user_positions[user_id] = idx
+        await send_course_message(call, courses[idx], idx, len(courses), "course", category)
+        await answer()
+        return
+
+    if data.startswith("catpopular:"):
+        category = data.split(':')[1]
+        view = popular_views.get(category)
+        if view is None:
+            await call.answer("Пока нет популярных курсов в этой категории.")
+            return
+        answer = answer_early(call)
         user_states[user_id] = f"category:{category}"
         user_positions[user_id] = 0
-        await send_course_message(call, courses[0], 0, len(courses), "course")
-        await call.answer()
+        text, keyboard = view
+        await call.message.edit_text(text, reply_markup=keyboard)
+        await answer()
+        return
+
+    if data.startswith("course_open:"):
+        location = COURSE_LOCATIONS.get(int(data.split(':')[1]))
+        if location is None:
+            await call.answer("Курс не найден.")
+            return
+        answer = answer_early(call)
+        category, idx = location
+        courses = courses_in_category(category)
+        user_states[user_id] = f"category:{category}"
+        user_positions[user_id] = idx
+        await send_course_message(call, courses[idx], idx, len(courses), "course", category)
+        await answer()
         return
 
-    if data in ("course_prev", "course_next"):
+    if data == "noop":
+        await answer()
+        return
+
+    if action in ("course_prev", "course_next"):
         state = user_states.get(user_id, "")
-        if not isinstance(state, str) or not state.startswith("category:"):
-            await call.answer()
+        parts = data.split(':')
+        if len(parts) == 3:
+            category, idx = parts[1], int(parts[2])
+            user_states[user_id] = f"category:{category}"
+        elif isinstance(state, str) and state.startswith("category:"):
+            category = state.split(':')[1]
+            idx = user_positions.get(user_id, 0)
+        else:
+            await answer()
             return
-        category = state.split(':')[1]
         courses = courses_in_category(category)
-        idx = user_positions.get(user_id, 0)
-        if data == "course_prev" and idx > 0:
+        if not courses:
+            await answer()
+            return
+        idx = min(idx, len(courses) - 1)
+        if action == "course_prev" and idx > 0:
             idx -= 1
-        elif data == "course_next" and idx < len(courses) - 1:
+        elif action == "course_next" and idx < len(courses) - 1:
             idx += 1
         user_positions[user_id] = idx
-        await send_course_message(call, courses[idx], idx, len(courses), "course")
-        await call.answer()
+        await send_course_message(call, courses[idx], idx, len(courses), "course", category)
+        await answer()
         return
 
     if data == "choose_course_number":
@@ -226,19 +727,26 @@ async def callbacks_handler(call: types.CallbackQuery):
             total = len(fav_list)
 
         await call.message.edit_text(f"Введите номер курса от 1 до {total} для перехода или 'Отмена' для отмены.")
-        await call.answer()
+        await answer()
         return
 
     if data == "start_search":
         await call.message.edit_text("Введите запрос для поиска или напишите 'Отмена' для отмены.")
         user_states[user_id] = "awaiting_search"
-        await call.answer()
+        await answer()
+        return
+
+    if data.startswith("search_q:"):
+        answer = answer_early(call)
+        text, keyboard = run_user_search(user_id, data.split(':', 1)[1])
+        await call.message.edit_text(text, reply_markup=keyboard)
+        await answer()
         return
 
     if data in ("search_prev", "search_next"):
         state = user_states.get(user_id)
         if not state or not isinstance(state, dict) or state.get("type") != "local_search_results":
-            await call.answer()
+            await answer()
             return
         idx = user_positions.get(user_id, 0)
         results = state["results"]
@@ -251,8 +759,9 @@ async def callbacks_handler(call: types.CallbackQuery):
         user_fav_list = favorites.setdefault(str(user_id), [])
         keyboard = course_navigation_keyboard(course, idx, len(results), "search", user_fav_list)
         text = f"Результаты поиска:\n\n{format_course_message(course, idx, len(results))}\nКатегория: {COURSE_CATEGORIES.get(category, category)}"
+        analytics.track("course_view", user_id, course_id=course['id'], source="search")
         await call.message.edit_text(text, reply_markup=keyboard)
-        await call.answer()
+        await answer()
         return
 
     if data == "view_favorites":
@@ -277,22 +786,30 @@ async def callbacks_handler(call: types.CallbackQuery):
         if course:
             keyboard = course_navigation_keyboard(course, idx, len(fav_list), "fav", fav_list)
             text = format_course_message(course, idx, len(fav_list))
+            analytics.track("course_view", user_id, course_id=course['id'], source="fav")
             await call.message.edit_text(text, reply_markup=keyboard)
-        await call.answer()
+        await answer()
         return
 
-    if data in ("fav_prev", "fav_next"):
-        if user_states.get(user_id) != "fav_view":
-            await call.answer()
+    if action in ("fav_prev", "fav_next"):
+        parts = data.split(':')
+        if len(parts) == 2:
+            idx = int(parts[1])
+            user_states[user_id] = "fav_view"
+        elif user_states.get(user_id) == "fav_view":
+            idx = user_positions.get(user_id, 0)
+        else:
+            await answer()
             return
         fav_list = favorites.get(str(user_id), [])
         if not fav_list:
             await call.answer("Избранное пусто.", show_alert=True)
             return
-        idx = user_positions.get(user_id, 0)
-        if data == "fav_prev" and idx > 0:
+        answer = answer_early(call)
+        idx = min(idx, len(fav_list) - 1)
+        if action == "fav_prev" and idx > 0:
             idx -= 1
-        elif data == "fav_next" and idx < len(fav_list) - 1:
+        elif action == "fav_next" and idx < len(fav_list) - 1:
             idx += 1
         user_positions[user_id] = idx
         fav_id = fav_list[idx]
@@ -307,16 +824,18 @@ async def callbacks_handler(call: types.CallbackQuery):
         if course:
             keyboard = course_navigation_keyboard(course, idx, len(fav_list), "fav", fav_list)
             text = format_course_message(course, idx, len(fav_list))
+            analytics.track("course_view", user_id, course_id=course['id'], source="fav")
             await call.message.edit_text(text, reply_markup=keyboard)
-        await call.answer()
+        await answer()
         return
 
     if data.startswith("fav_add:"):
         course_id = int(data.split(":")[1])
         fav_list = favorites.setdefault(str(user_id), [])
         if course_id not in fav_list:
-            fav_list.append(course_id)
+            add_favorite(user_id, course_id)
             save_favorites(favorites)
+            analytics.track("fav_add", user_id, course_id=course_id)
             await call.answer("Добавлено в избранное!")
         else:
             await call.answer("Уже в избранном.", show_alert=True)
@@ -326,8 +845,9 @@ async def callbacks_handler(call: types.CallbackQuery):
         course_id = int(data.split(":")[1])
         fav_list = favorites.setdefault(str(user_id), [])
         if course_id in fav_list:
-            fav_list.remove(course_id)
+            remove_favorite(user_id, course_id)
             save_favorites(favorites)
+            analytics.track("fav_remove", user_id, course_id=course_id)
             await call.answer("Удалено из избранного!")
             if user_states.get(user_id) == "fav_view":
                 fav_list_cur = favorites.get(str(user_id), [])
@@ -364,28 +884,45 @@ async def callbacks_handler(call: types.CallbackQuery):
         kb.button(text="Да, очистить", callback_data="fav_clear_yes")
         kb.button(text="Нет", callback_data="view_favorites")
         await call.message.edit_text("Вы уверены, что хотите очистить весь список избранного?", reply_markup=kb.as_markup())
-        await call.answer()
+        await answer()
         return
     if data == "fav_clear_yes":
-        favorites[str(user_id)] = []
+        clear_favorites(user_id)
         save_favorites(favorites)
+        analytics.track("fav_clear", user_id)
         await call.message.edit_text("Ваше избранное очищено.", reply_markup=main_menu_keyboard())
         user_states.pop(user_id, None)
         user_positions.pop(user_id, None)
-        await call.answer()
+        await answer()
         return
 
     if data == "admin_stats":
         if not is_admin(user_id):
             await call.answer("Доступ запрещён.", show_alert=True)
             return
-        total_users = len(favorites)
-        total_favs = sum(len(v) for v in favorites.values())
-        text = f"📊 Пользователей: {total_users}\nВсего избранных курсов: {total_favs}"
+        text = (
+            f"📊 Пользователей: {users.total()}\n"
+            f"Заблокировали бота: {users.blocked_count()}, удалены: {users.deactivated_count()}\n"
+            f"С избранным: {stats.users_with_favorites}\n"
+            f"Всего избранных курсов: {stats.total_favorites}\n"
+            f"Активных сессий (за {SESSION_IDLE_TIMEOUT / 60:.0f} мин): {len(user_states)}"
+        )
+        text += format_favorite_stats()
+        text += format_analytics_stats()
+        text += format_throttling_stats()
         kb = InlineKeyboardBuilder()
         kb.button(text="🏠 Главное меню", callback_data="back_main")
         await call.message.edit_text(text, reply_markup=kb.as_markup())
-        await call.answer()
+        await answer()
+        return
+    if data == "admin_memory":
+        if not is_admin(user_id):
+            await call.answer("Доступ запрещён.", show_alert=True)
+            return
+        kb = InlineKeyboardBuilder()
+        kb.button(text="🏠 Главное меню", callback_data="back_main")
+        await call.message.edit_text((await memory_profile.report())[:4000], reply_markup=kb.as_markup())
+        await answer()
         return
     if data == "admin_broadcast":
         if not is_admin(user_id):
@@ -393,7 +930,7 @@ async def callbacks_handler(call: types.CallbackQuery):
             return
         user_states[user_id] = "admin_broadcast_wait"
         await call.message.edit_text("Введите сообщение для рассылки всем пользователям или 'Отмена' для отмены:")
-        await call.answer()
+        await answer()
         return
 
 @dp.message()
@@ -431,8 +968,9 @@ async def generic_message_handler(message: types.Message):
             user_positions[user_id] = idx
             user_states[user_id] = f"category:{category}"
             text = format_course_message(courses[idx], idx, total)
+            analytics.track("course_view", user_id, course_id=courses[idx]['id'], source=prefix)
             user_fav_list = favorites.setdefault(str(user_id), [])
-            keyboard = course_navigation_keyboard(courses[idx], idx, total, prefix, user_fav_list)
+            keyboard = course_navigation_keyboard(courses[idx], idx, total, prefix, user_fav_list, category)
             await message.answer(text, reply_markup=keyboard)
             return
 
@@ -454,6 +992,7 @@ async def generic_message_handler(message: types.Message):
             user_fav_list = favorites.setdefault(str(user_id), [])
             keyboard = course_navigation_keyboard(course, idx, total, prefix, user_fav_list)
             text = f"Результаты поиска:\n\n{format_course_message(course, idx, total)}\nКатегория: {COURSE_CATEGORIES.get(category, category)}"
+            analytics.track("course_view", user_id, course_id=course['id'], source=prefix)
             await message.answer(text, reply_markup=keyboard)
             return
 
@@ -478,6 +1017,7 @@ async def generic_message_handler(message: types.Message):
             if course:
                 keyboard = course_navigation_keyboard(course, idx, total, prefix, fav_list)
                 text = format_course_message(course, idx, total)
+                analytics.track("course_view", user_id, course_id=course['id'], source=prefix)
                 await message.answer(text, reply_markup=keyboard)
             return
 
@@ -487,18 +1027,7 @@ async def generic_message_handler(message: types.Message):
             user_positions.pop(user_id, None)
             await message.answer("Поиск отменён.", reply_markup=main_menu_keyboard())
             return
-        query = message.text.strip()
-        results = search_courses(query)
-        if not results:
-            await message.answer("Ничего не найдено. Попробуйте другой запрос.", reply_markup=main_menu_keyboard())
-            user_states.pop(user_id, None)
-            return
-        user_states[user_id] = {"type": "local_search_results", "results": results}
-        user_positions[user_id] = 0
-        category, course = results[0]
-        user_fav_list = favorites.setdefault(str(user_id), [])
-        keyboard = course_navigation_keyboard(course, 0, len(results), "search", user_fav_list)
-        text = f"Результаты поиска:\n\n{format_course_message(course, 0, len(results))}\nКатегория: {COURSE_CATEGORIES.get(category, category)}"
+        text, keyboard = run_user_search(user_id, message.text.strip())
         await message.answer(text, reply_markup=keyboard)
 
     elif state == "admin_broadcast_wait":
@@ -507,18 +1036,40 @@ async def generic_message_handler(message: types.Message):
             await message.answer("Рассылка отменена.", reply_markup=main_menu_keyboard())
             return
         broadcast_text = message.text.strip()
-        count_sent = 0
-        for uid_str in favorites.keys():
-            try:
-                await bot.send_message(int(uid_str), f"📢 Сообщение от администрации:\n\n{broadcast_text}")
-                count_sent += 1
-            except Exception:
-                pass
-        await message.answer(f"Рассылка выполнена: {count_sent} сообщений.", reply_markup=main_menu_keyboard())
+        count_sent, count_failed = await broadcast(f"📢 Сообщение от администрации:\n\n{broadcast_text}")
+        await message.answer(
+            f"Рассылка выполнена: {count_sent} сообщений, не доставлено: {count_failed}.",
+            reply_markup=main_menu_keyboard()
+        )
         user_states.pop(user_id, None)
     else:
         await message.answer("Используйте /start для меню.", reply_markup=main_menu_keyboard())
 
+@dp.startup()
+async def on_startup():
+    sessions.load()
+    analytics.start()
+    await metrics.start()
+    run_in_background(users_save_loop())
+    run_in_background(session_expiry_loop())
+    memory_profile.start()
+    build_popular_views()
+    run_in_background(warm_up_search())
+    run_in_background(popular_refresh_loop())
+
+@dp.shutdown()
+async def on_shutdown():
+    try:
+        await asyncio.wait_for(throttling.idle.wait(), SHUTDOWN_DRAIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        print(f"Не дождались завершения обработчиков: {throttling.in_flight}")
+    save_favorites(favorites)
+    sessions.save(user_states, user_positions)
+    users.save()
+    memory_profile.stop()
+    await metrics.stop()
+    await analytics.stop()
+
 if __name__ == "__main__":
     print("Bot started!")
     asyncio.run(dp.start_polling(bot))
@@ -0,0 +1,230 @@
+import bisect
+import heapq
+import math
+import os
+import re
+from collections import Counter, defaultdict
+import numpy as np
+from rapidfuzz import fuzz, process
+from courses_data import COURSES
+
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "fuzzy")
+FUZZY_THRESHOLD = 70
+TFIDF_RELATIVE_CUTOFF = float(os.getenv("TFIDF_RELATIVE_CUTOFF", "0.3"))
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "50"))
+HYBRID_FUZZY_WEIGHT = float(os.getenv("HYBRID_FUZZY_WEIGHT", "0.3"))
+CHAR_NGRAM = 3
+TITLE_WEIGHT = 2
+
+EN_LAYOUT = "qwertyuiop[]asdfghjkl;'zxcvbnm,.`"
+RU_LAYOUT = "йцукенгшщзхъфывапролджэячсмитьбюё"
+LAYOUT_SWAP = str.maketrans(EN_LAYOUT + RU_LAYOUT, RU_LAYOUT + EN_LAYOUT)
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+def searchable_text(course):
+    return f"{course['title']} {course.get('description', '')} {course.get('year', '')} " + \
+           " ".join(link['title'] + " " + link['url'] for link in course.get('links', []))
+
+def transliterate(text):
+    return text.lower().translate(TRANSLIT)
+
+def words(text):
+    return re.findall(r"\w+", text.lower())
+
+CATALOG = [(category, course) for category, courses in COURSES.items() for course in courses]
+SEARCH_TEXTS = [searchable_text(course).lower() for _, course in CATALOG]
+TRANSLIT_FORMS = []
+TRANSLIT_FORM_IDS = []
+for doc_id, text in enumerate(SEARCH_TEXTS):
+    if not text.isascii():
+        TRANSLIT_FORMS.append(transliterate(text))
+        TRANSLIT_FORM_IDS.append(doc_id)
+TRANSLIT_FORM_DOC_IDS = np.array(TRANSLIT_FORM_IDS, dtype=np.intp)
+SUGGEST_MIN_SCORE = 70
+
+def vocabulary_counts(catalog):
+    counts = Counter()
+    for _, course in catalog:
+        text = f"{course['title']} {course.get('description', '')}"
+        counts.update({word for word in words(text) if len(word) > 1 and not word.isdigit()})
+    return counts
+
+WORD_COUNTS = vocabulary_counts(CATALOG)
+VOCABULARY = sorted(WORD_COUNTS)
+
+def known_word(word):
+    pos = bisect.bisect_left(VOCABULARY, word)
+    return pos < len(VOCABULARY) and VOCABULARY[pos].startswith(word)
+
+def prefix_range(prefix):
+    start = bisect.bisect_left(VOCABULARY, prefix)
+    end = bisect.bisect_left(VOCABULARY, prefix + "\U0010ffff", start)
+    return start, end
+
+def complete(prefix, limit=5):
+    start, end = prefix_range(prefix.lower())
+    return heapq.nlargest(limit, VOCABULARY[start:end], key=WORD_COUNTS.__getitem__)
+
+def closest_word(word):
+    if WORD_COUNTS.get(word):
+        return word, 100
+    match = process.extractOne(word, VOCABULARY, scorer=fuzz.ratio, score_cutoff=SUGGEST_MIN_SCORE)
+    return (match[0], match[1]) if match else (None, 0)
+
+def suggest(query, limit=3):
+    query_words = words(query)
+    if not query_words:
+        return []
+    candidates = []
+    for variant in query_variants(query):
+        variant_words = words(variant)
+        matches = [closest_word(word) for word in variant_words]
+        corrected = [word for word, _ in matches]
+        if all(corrected):
+            candidates.append((min(score for _, score in matches), " ".join(corrected)))
+        if all(corrected[:-1]):
+            head, head_score = corrected[:-1], min((score for _, score in matches[:-1]), default=100)
+        else:
+            head, head_score = variant_words[:-1], 0
+        for completion in complete(variant_words[-1], limit):
+            candidates.append((head_score, " ".join(head + [completion])))
+    candidates.sort(key=lambda item: item[0], reverse=True)
+    original = " ".join(query_words)
+    suggestions = []
+    for _, candidate in candidates:
+        if candidate != original and candidate not in suggestions:
+            suggestions.append(candidate)
+    return suggestions[:limit]
+
+def query_variants(query):
+    query = query.lower()
+    variants = [query]
+    swapped = query.translate(LAYOUT_SWAP)
+    if swapped != query and any(known_word(word) for word in words(swapped) if len(word) > 2):
+        variants.append(swapped)
+    for variant in list(variants):
+        if not variant.isascii():
+            latin = transliterate(variant)
+            if latin not in variants:
+                variants.append(latin)
+    return variants
+
+def features(text):
+    result = []
+    for word in words(text):
+        result.append("w:" + word)
+        padded = f" {word} "
+        if len(padded) > CHAR_NGRAM:
+            result.extend("c:" + padded[i:i + CHAR_NGRAM] for i in range(len(padded) - CHAR_NGRAM + 1))
+    return result
+
+def translit_features(text):
+    return features(" ".join(word.translate(TRANSLIT) for word in words(text) if not word.isascii()))
+
+def course_features(course):
+    text = f"{course.get('description', '')} {course.get('year', '')} " + \
+           " ".join(link['title'] for link in course.get('links', []))
+    title = features(course['title']) + translit_features(course['title'])
+    return title * TITLE_WEIGHT + features(text) + translit_features(text)
+
+def normalized_vector(counts, idf):
+    vector = {}
+    for term, count in counts.items():
+        weight = idf.get(term)
+        if weight:
+            vector[term] = (1 + math.log(count)) * weight
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if norm:
+        for term in vector:
+            vector[term] /= norm
+    return vector
+
+def build_tfidf_index(catalog):
+    doc_counts = [Counter(course_features(course)) for _, course in catalog]
+    df = Counter()
+    for counts in doc_counts:
+        df.update(counts.keys())
+    total = len(doc_counts)
+    idf = {term: math.log((1 + total) / (1 + freq)) + 1 for term, freq in df.items()}
+    postings = defaultdict(list)
+    for doc_id, counts in enumerate(doc_counts):
+        for term, weight in normalized_vector(counts, idf).items():
+            postings[term].append((doc_id, weight))
+    columns = {term: col for col, term in enumerate(postings)}
+    indptr = np.zeros(len(columns) + 1, dtype=np.intp)
+    indptr[1:] = np.cumsum([len(entries) for entries in postings.values()])
+    entries = [entry for term_entries in postings.values() for entry in term_entries]
+    doc_ids = np.array([doc_id for doc_id, _ in entries], dtype=np.intp)
+    weights = np.array([weight for _, weight in entries], dtype=np.float64)
+    return idf, columns, indptr, doc_ids, weights
+
+TFIDF_IDF, TFIDF_COLUMNS, TFIDF_INDPTR, TFIDF_DOC_IDS, TFIDF_WEIGHTS = build_tfidf_index(CATALOG)
+
+def tfidf_scores(query):
+    counts = Counter()
+    for variant in query_variants(query):
+        counts |= Counter(features(variant))
+    query_vector = normalized_vector(counts, TFIDF_IDF)
+    scores = np.zeros(len(CATALOG))
+    for term, query_weight in query_vector.items():
+        col = TFIDF_COLUMNS[term]
+        start, end = TFIDF_INDPTR[col], TFIDF_INDPTR[col + 1]
+        scores[TFIDF_DOC_IDS[start:end]] += query_weight * TFIDF_WEIGHTS[start:end]
+    return scores
+
+def top_k(scores, k):
+    candidates = np.flatnonzero(scores)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(scores[candidates], -k)[-k:]]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    if not len(candidates):
+        return candidates
+    return candidates[scores[candidates] >= scores[candidates[0]] * TFIDF_RELATIVE_CUTOFF]
+
+def best_scores(variants, forms):
+    matrix = process.cdist(variants, forms, scorer=fuzz.partial_ratio, score_cutoff=FUZZY_THRESHOLD)
+    return matrix.max(axis=0)
+
+def fuzzy_scores(query):
+    variants = query_variants(query)
+    matrix = process.cdist(variants, SEARCH_TEXTS, scorer=fuzz.partial_ratio, score_cutoff=FUZZY_THRESHOLD)
+    doc_scores = matrix[0]
+    if not (doc_scores > FUZZY_THRESHOLD).any():
+        doc_scores = matrix.max(axis=0)
+    if not (doc_scores > FUZZY_THRESHOLD).any():
+        latin = [variant for variant in variants if variant.isascii()]
+        if latin and TRANSLIT_FORMS:
+            doc_scores = np.zeros_like(doc_scores)
+            np.maximum.at(doc_scores, TRANSLIT_FORM_DOC_IDS, best_scores(latin, TRANSLIT_FORMS))
+    return {int(doc_id): float(doc_scores[doc_id]) for doc_id in np.flatnonzero(doc_scores > FUZZY_THRESHOLD)}
+
+def search_fuzzy(query):
+    return [CATALOG[doc_id] for doc_id in sorted(fuzzy_scores(query))]
+
+def search_tfidf(query, k=SEARCH_TOP_K):
+    return [CATALOG[doc_id] for doc_id in top_k(tfidf_scores(query), k)]
+
+def search_hybrid(query, k=SEARCH_TOP_K):
+    blended = (1 - HYBRID_FUZZY_WEIGHT) * tfidf_scores(query)
+    for doc_id, score in fuzzy_scores(query).items():
+        blended[doc_id] += HYBRID_FUZZY_WEIGHT * score / 100
+    return [CATALOG[doc_id] for doc_id in top_k(blended, k)]
+
+ENGINES = {
+    "fuzzy": search_fuzzy,
+    "tfidf": search_tfidf,
+    "hybrid": search_hybrid,
+}
+
+if SEARCH_ENGINE not in ENGINES:
+    print(f"Неизвестный SEARCH_ENGINE={SEARCH_ENGINE}, используется fuzzy")
+    SEARCH_ENGINE = "fuzzy"
+
+def search(query, engine=None):
+    return ENGINES[engine or SEARCH_ENGINE](query)
@@ -0,0 +1,60 @@
+import json
+import os
+import time
+
+SESSIONS_FILE = os.getenv("SESSIONS_FILE", "sessions.json")
+SESSIONS_MAX_AGE = float(os.getenv("SESSIONS_MAX_AGE", "86400"))
+
+pending = {}
+
+def is_navigation_state(state):
+    if isinstance(state, str):
+        return state.startswith("category:") or state == "fav_view"
+    return isinstance(state, dict) and state.get("type") == "local_search_results"
+
+def is_fresh(entry, now):
+    return len(entry) == 3 and is_navigation_state(entry[0]) and now - entry[2] < SESSIONS_MAX_AGE
+
+def encode_state(state):
+    if isinstance(state, dict) and state.get("type") == "local_search_results":
+        return {"type": "local_search_results", "ids": [course['id'] for _, course in state["results"]]}
+    return state
+
+def decode_state(state, find_course):
+    if isinstance(state, dict) and state.get("type") == "local_search_results":
+        results = [find_course(course_id) for course_id in state.get("ids", [])]
+        results = [result for result in results if result is not None]
+        return {"type": "local_search_results", "results": results} if results else None
+    return state
+
+def save(user_states, user_positions, path=SESSIONS_FILE):
+    now = time.time()
+    data = {user_id: entry for user_id, entry in pending.items() if is_fresh(entry, now)}
+    for user_id, state in user_states.items():
+        if is_navigation_state(state):
+            data[str(user_id)] = [encode_state(state), user_positions.get(user_id), now]
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Ошибка сохранения сессий: {e}")
+
+def load(path=SESSIONS_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        now = time.time()
+        pending.update((user_id, entry) for user_id, entry in data.items() if is_fresh(entry, now))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Ошибка загрузки сессий: {e}")
+
+def restore(user_id, find_course):
+    entry = pending.pop(str(user_id), None)
+    if entry is None or not is_fresh(entry, time.time()):
+        return None
+    state, position, _ = entry
+    return decode_state(state, find_course), position
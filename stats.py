@@ -0,0 +1,57 @@
+import bisect
+from collections import Counter
+
+total_favorites = 0
+users_with_favorites = 0
+course_counts = {}
+category_counts = Counter()
+ranking = []
+course_categories = {}
+
+def set_course_count(course_id, count):
+    old = course_counts.get(course_id, 0)
+    if old:
+        del ranking[bisect.bisect_left(ranking, (-old, course_id))]
+    if count > 0:
+        course_counts[course_id] = count
+        bisect.insort(ranking, (-count, course_id))
+    else:
+        course_counts.pop(course_id, None)
+
+def add_favorite(fav_list, course_id):
+    global total_favorites, users_with_favorites
+    if not fav_list:
+        users_with_favorites += 1
+    total_favorites += 1
+    category_counts[course_categories.get(course_id)] += 1
+    set_course_count(course_id, course_counts.get(course_id, 0) + 1)
+
+def remove_favorite(fav_list, course_id):
+    global total_favorites, users_with_favorites
+    if not fav_list:
+        users_with_favorites -= 1
+    total_favorites -= 1
+    category = course_categories.get(course_id)
+    category_counts[category] -= 1
+    if category_counts[category] <= 0:
+        del category_counts[category]
+    set_course_count(course_id, course_counts.get(course_id, 0) - 1)
+
+def build(favorites, categories):
+    global total_favorites, users_with_favorites
+    course_categories.clear()
+    course_categories.update(categories)
+    counts = Counter()
+    for fav_list in favorites.values():
+        counts.update(fav_list)
+    total_favorites = sum(counts.values())
+    users_with_favorites = sum(1 for fav_list in favorites.values() if fav_list)
+    course_counts.clear()
+    course_counts.update(counts)
+    ranking[:] = sorted((-count, course_id) for course_id, count in counts.items())
+    category_counts.clear()
+    for course_id, count in counts.items():
+        category_counts[course_categories.get(course_id)] += count
+
+def top_courses(n=10):
+    return [(course_id, -neg_count) for neg_count, course_id in ranking[:n]]
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from collections import Counter
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message
+
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "3"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "10"))
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+BUCKET_PRUNE_SIZE = 100000
+
+PRIORITY_ADMIN = "admin"
+PRIORITY_SEARCH = "search"
+PRIORITY_ACTION = "action"
+PRIORITY_NAVIGATION = "navigation"
+
+NAVIGATION_CALLBACKS = {
+    "course_prev", "course_next", "search_prev", "search_next", "fav_prev", "fav_next", "noop",
+}
+NAVIGATION_PREFIXES = ("catpage:", "catcourse:", "catpopular:", "course_open:")
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, admin_ids, rate=THROTTLE_RATE, burst=THROTTLE_BURST, max_concurrent=MAX_CONCURRENT_UPDATES):
+        self.admin_ids = admin_ids
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.slots = asyncio.Semaphore(max_concurrent)
+        self.buckets = {}
+        self.navigating = set()
+        self.in_flight = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.metrics = Counter()
+
+    def priority(self, event, user_id):
+        if user_id in self.admin_ids:
+            return PRIORITY_ADMIN
+        if isinstance(event, CallbackQuery):
+            data = event.data or ""
+            if data.split(':', 1)[0] in NAVIGATION_CALLBACKS or data.startswith(NAVIGATION_PREFIXES):
+                return PRIORITY_NAVIGATION
+            return PRIORITY_ACTION
+        if isinstance(event, Message):
+            return PRIORITY_SEARCH
+        return PRIORITY_ACTION
+
+    def take_token(self, user_id):
+        now = time.monotonic()
+        tokens, last = self.buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self.buckets[user_id] = (tokens, now)
+            return False
+        self.buckets[user_id] = (tokens - 1, now)
+        if len(self.buckets) > BUCKET_PRUNE_SIZE:
+            self.prune_buckets(now)
+        return True
+
+    def prune_buckets(self, now):
+        refill_time = self.burst / self.rate
+        stale = [user_id for user_id, (_, last) in self.buckets.items() if now - last >= refill_time]
+        for user_id in stale:
+            del self.buckets[user_id]
+
+    async def __call__(self, handler, event, data):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        user_id = user.id
+        priority = self.priority(event, user_id)
+
+        if priority == PRIORITY_ADMIN:
+            return await self.run(handler, event, data, priority)
+
+        if priority == PRIORITY_NAVIGATION:
+            if user_id in self.navigating:
+                return await self.drop(event, "shed_redundant")
+            if self.slots.locked():
+                return await self.drop(event, "shed_overload")
+
+        if not self.take_token(user_id):
+            return await self.drop(event, "throttled", "Слишком много запросов, подождите немного.")
+
+        if priority == PRIORITY_NAVIGATION:
+            self.navigating.add(user_id)
+            try:
+                return await self.run(handler, event, data, priority, limited=True)
+            finally:
+                self.navigating.discard(user_id)
+
+        return await self.run(handler, event, data, priority, limited=True)
+
+    async def drop(self, event, reason, text=None):
+        self.metrics[reason] += 1
+        if isinstance(event, CallbackQuery):
+            try:
+                await event.answer(text)
+            except Exception as e:
+                self.metrics["drop_answer_failed"] += 1
+                print(f"Ошибка ответа на отброшенный callback: {e!r}")
+        return None
+
+    async def run(self, handler, event, data, priority, limited=False):
+        self.in_flight += 1
+        self.idle.clear()
+        try:
+            if not limited:
+                self.metrics[f"processed_{priority}"] += 1
+                return await handler(event, data)
+            if self.slots.locked():
+                self.metrics["queued"] += 1
+            async with self.slots:
+                self.metrics[f"processed_{priority}"] += 1
+                return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            if self.in_flight == 0:
+                self.idle.set()
+
+    def snapshot(self):
+        return {
+            **self.metrics,
+            "in_flight": self.in_flight,
+            "tracked_users": len(self.buckets),
+        }
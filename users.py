@@ -0,0 +1,104 @@
+import bisect
+import os
+import struct
+from array import array
+
+USERS_FILE = os.getenv("USERS_FILE", "users.bin")
+
+FLAG_BLOCKED = 1
+FLAG_DEACTIVATED = 2
+
+user_ids = array('q')
+flags = bytearray()
+flag_counts = {FLAG_BLOCKED: 0, FLAG_DEACTIVATED: 0}
+dirty = False
+
+def find(user_id):
+    pos = bisect.bisect_left(user_ids, user_id)
+    if pos < len(user_ids) and user_ids[pos] == user_id:
+        return pos
+    return None
+
+def set_flag(pos, flag):
+    global dirty
+    old = flags[pos]
+    if old == flag:
+        return
+    if old:
+        flag_counts[old] -= 1
+    if flag:
+        flag_counts[flag] += 1
+    flags[pos] = flag
+    dirty = True
+
+def register(user_id):
+    global dirty
+    pos = bisect.bisect_left(user_ids, user_id)
+    if pos < len(user_ids) and user_ids[pos] == user_id:
+        if flags[pos]:
+            set_flag(pos, 0)
+        return
+    user_ids.insert(pos, user_id)
+    flags.insert(pos, 0)
+    dirty = True
+
+def mark_blocked(user_id):
+    pos = find(user_id)
+    if pos is not None:
+        set_flag(pos, FLAG_BLOCKED)
+
+def mark_deactivated(user_id):
+    pos = find(user_id)
+    if pos is not None:
+        set_flag(pos, FLAG_DEACTIVATED)
+
+def deliverable():
+    return array('q', (user_id for user_id, flag in zip(user_ids, flags) if not flag))
+
+def total():
+    return len(user_ids)
+
+def blocked_count():
+    return flag_counts[FLAG_BLOCKED]
+
+def deactivated_count():
+    return flag_counts[FLAG_DEACTIVATED]
+
+def save(path=USERS_FILE):
+    global dirty
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<Q', len(user_ids)))
+            f.write(user_ids.tobytes())
+            f.write(bytes(flags))
+        os.replace(tmp_path, path)
+        dirty = False
+    except Exception as e:
+        print(f"Ошибка сохранения пользователей: {e}")
+
+def load(path=USERS_FILE):
+    try:
+        with open(path, 'rb') as f:
+            (count,) = struct.unpack('<Q', f.read(8))
+            ids = array('q')
+            ids.frombytes(f.read(count * ids.itemsize))
+            loaded_flags = bytearray(f.read(count))
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"Ошибка загрузки пользователей: {e}")
+        return False
+    user_ids[:] = ids
+    flags[:] = loaded_flags
+    for flag in flag_counts:
+        flag_counts[flag] = flags.count(flag)
+    return True
+
+def seed(ids):
+    global dirty
+    merged = sorted(set(user_ids).union(ids))
+    old_flags = dict(zip(user_ids, flags))
+    user_ids[:] = array('q', merged)
+    flags[:] = bytearray(old_flags.get(user_id, 0) for user_id in merged)
+    dirty = True